@@ -1,7 +1,9 @@
-﻿from datetime import date, datetime
-from typing import List
+﻿from datetime import date
+from functools import lru_cache
+from typing import Callable, Iterable, List, Tuple
 
 import math
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
@@ -9,12 +11,20 @@ import streamlit as st
 from finance_ai.calculations import (
     FutureExpense,
     MonthlyRecord,
-    build_future_expense_plan,
+    PreparedExpensePlan,
+    add_months,
     compute_total_gap,
+    evaluate_expense_plan,
+    prepare_expense_plan,
     required_emergency_fund,
     summarize_cash_flow,
 )
-from finance_ai.forecast import forecast_expenses
+from finance_ai.forecast import forecast_from_totals
+
+try:
+    import polars as pl
+except ImportError:  # polars is optional; large tables use the pandas path without it.
+    pl = None
 
 st.set_page_config(page_title="AI Finance Planner", page_icon="AI", layout="wide")
 
@@ -26,23 +36,31 @@ st.write(
 
 
 
-def _add_months(base: date, months: int) -> date:
-    year = base.year + (base.month - 1 + months) // 12
-    month = (base.month - 1 + months) % 12 + 1
-    return date(year, month, 1)
+_SMALL_TABLE_ROWS = 100
+
+_CATEGORY_MAP = {
+    "essential": "Essential",
+    "discretionary": "Discretionary",
+    "other": "Other",
+    "savings": "Savings",
+}
 
 
+@lru_cache(maxsize=64)
 def _normalize_category(value: object) -> str:
     if value is None:
         return "Other"
-    normalized = str(value).strip().lower()
-    mapping = {
-        "essential": "Essential",
-        "discretionary": "Discretionary",
-        "other": "Other",
-        "savings": "Savings",
-    }
-    return mapping.get(normalized, "Other")
+    return _CATEGORY_MAP.get(str(value).strip().lower(), "Other")
+
+
+def _normalize_categories(values: pd.Series) -> pd.Series:
+    return values.fillna("").astype(str).str.strip().str.lower().map(_CATEGORY_MAP).fillna("Other")
+
+
+def _session_seed(name: str, build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    if name not in st.session_state:
+        st.session_state[name] = build()
+    return st.session_state[name]
 
 
 def _default_breakdown() -> pd.DataFrame:
@@ -56,39 +74,73 @@ def _default_breakdown() -> pd.DataFrame:
     )
 
 
-def _aggregate_breakdown(df: pd.DataFrame) -> dict:
+def _aggregate_breakdown_rows(rows: Iterable[Tuple[object, object]]) -> dict:
     totals = {"Essential": 0.0, "Discretionary": 0.0, "Other": 0.0, "Savings": 0.0}
-    for _, row in df.iterrows():
-        amount = float(row.get("amount", 0.0) or 0.0)
-        if amount <= 0:
+    for amount, category in rows:
+        amount = float(amount or 0.0)
+        if not amount > 0:
             continue
-        category = _normalize_category(row.get("category"))
-        totals.setdefault(category, 0.0)
-        totals[category] += amount
+        totals[_normalize_category(category)] += amount
+    totals["total"] = totals["Essential"] + totals["Discretionary"] + totals["Other"] + totals["Savings"]
+    return totals
+
+
+def _category_totals_pandas(df: pd.DataFrame) -> Iterable[Tuple[str, float]]:
+    amounts = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    mask = amounts > 0
+    categories = _normalize_categories(df["category"][mask]).to_numpy()
+    return pd.Series(amounts[mask]).groupby(categories).sum().items()
+
+
+def _category_totals_polars(df: pd.DataFrame) -> Iterable[Tuple[str, float]]:
+    frame = pl.from_pandas(df[["amount", "category"]].astype({"amount": float, "category": str}))
+    return (
+        frame.select(
+            pl.col("amount").fill_nan(None).fill_null(0.0),
+            pl.col("category")
+            .fill_null("")
+            .str.strip_chars()
+            .str.to_lowercase()
+            .replace_strict(_CATEGORY_MAP, default="Other"),
+        )
+        .filter(pl.col("amount") > 0)
+        .group_by("category")
+        .agg(pl.col("amount").sum())
+        .iter_rows()
+    )
+
+
+def _aggregate_breakdown(df: pd.DataFrame) -> dict:
+    if len(df) < _SMALL_TABLE_ROWS:
+        return _aggregate_breakdown_rows(df[["amount", "category"]].itertuples(index=False, name=None))
+    category_totals = _category_totals_polars(df) if pl is not None else _category_totals_pandas(df)
+    totals = {"Essential": 0.0, "Discretionary": 0.0, "Other": 0.0, "Savings": 0.0}
+    for category, amount in category_totals:
+        totals[category] += float(amount)
     totals["total"] = totals["Essential"] + totals["Discretionary"] + totals["Other"] + totals["Savings"]
     return totals
 
 
 def _collect_breakdown_entries(df: pd.DataFrame) -> List[dict]:
     entries: List[dict] = []
-    for _, row in df.iterrows():
-        name = str(row.get("name", "")).strip()
-        amount = float(row.get("amount", 0.0) or 0.0)
+    for name, amount, category in df[["name", "amount", "category"]].itertuples(index=False, name=None):
+        name = str(name).strip()
+        amount = float(amount or 0.0)
         if not name or amount <= 0:
             continue
-        category = _normalize_category(row.get("category"))
-        entries.append({"name": name, "category": category, "amount": amount})
+        entries.append({"name": name, "category": _normalize_category(category), "amount": amount})
     return entries
 
 
+@st.cache_data(show_spinner=False)
 def _default_history(
     monthly_income: float,
     essential_expenses: float,
     discretionary_expenses: float,
     other_expenses: float,
     current_savings: float,
+    today: date,
 ) -> pd.DataFrame:
-    today = date.today().replace(day=1)
     periods = pd.date_range(end=pd.Timestamp(today), periods=6, freq="MS")
     rows = []
     for idx, period in enumerate(periods):
@@ -112,7 +164,7 @@ st.write(
     "Use the breakdown table to list recurring expenses and the historical editor to refine your trends."
 )
 breakdown_df = st.data_editor(
-    _default_breakdown(),
+    _session_seed("_breakdown_seed", _default_breakdown),
     num_rows="dynamic",
     use_container_width=True,
     column_config={
@@ -153,6 +205,7 @@ history_df = st.data_editor(
         discretionary_expenses,
         other_expenses,
         current_savings,
+        date.today().replace(day=1),
     ),
     num_rows="dynamic",
     use_container_width=True,
@@ -161,20 +214,20 @@ history_df = st.data_editor(
 st.header("3. Future Expenses & Goals")
 
 
-def _default_future_expenses() -> pd.DataFrame:
-    today = date.today().replace(day=1)
+@st.cache_data(show_spinner=False)
+def _default_future_expenses(today: date) -> pd.DataFrame:
     return pd.DataFrame(
         [
             {
                 "name": "Insurance premium",
                 "amount": 1200.0,
-                "due_date": _add_months(today, 3),
+                "due_date": add_months(today, 3),
                 "priority": "High",
             },
             {
                 "name": "Holiday trip",
                 "amount": 1800.0,
-                "due_date": _add_months(today, 7),
+                "due_date": add_months(today, 7),
                 "priority": "Medium",
             },
         ]
@@ -182,7 +235,7 @@ def _default_future_expenses() -> pd.DataFrame:
 
 
 future_expense_df = st.data_editor(
-    _default_future_expenses(),
+    _session_seed("_future_seed", lambda: _default_future_expenses(date.today().replace(day=1))),
     num_rows="dynamic",
     use_container_width=True,
     column_config={
@@ -192,62 +245,89 @@ future_expense_df = st.data_editor(
 )
 
 
+_HISTORY_VALUE_COLUMNS = ["income", "essential", "discretionary", "other", "savings"]
+
+
 def _to_monthly_records(df: pd.DataFrame) -> List[MonthlyRecord]:
-    records: List[MonthlyRecord] = []
-    for _, row in df.iterrows():
-        month_value = str(row.get("month", "")).strip()
-        if not month_value:
-            continue
-        try:
-            period_date = datetime.strptime(month_value + "-01", "%Y-%m-%d").date()
-        except ValueError:
-            continue
-        records.append(
-            MonthlyRecord(
-                period=period_date,
-                income=float(row.get("income", 0.0) or 0.0),
-                essential_expenses=float(row.get("essential", 0.0) or 0.0),
-                discretionary_expenses=float(row.get("discretionary", 0.0) or 0.0),
-                other_expenses=float(row.get("other", 0.0) or 0.0),
-                savings_contribution=float(row.get("savings", 0.0) or 0.0),
-            )
-        )
-    return records
+    months = df["month"].astype(str).str.strip()
+    periods = pd.to_datetime(months + "-01", format="%Y-%m-%d", errors="coerce")
+    valid = periods.notna().to_numpy()
+    values = df.loc[valid, _HISTORY_VALUE_COLUMNS].to_numpy(dtype=float, na_value=0.0)
+    return [
+        MonthlyRecord(period, *row)
+        for period, row in zip(periods[valid].dt.date, values.tolist())
+    ]
 
 
 def _to_future_expenses(df: pd.DataFrame) -> List[FutureExpense]:
-    expenses: List[FutureExpense] = []
-    for _, row in df.iterrows():
-        name = str(row.get("name", "")).strip()
-        if not name:
-            continue
-        due = row.get("due_date")
-        if isinstance(due, str):
-            try:
-                due_date = datetime.strptime(due, "%Y-%m-%d").date()
-            except ValueError:
-                continue
-        elif isinstance(due, pd.Timestamp):
-            due_date = due.date()
-        elif isinstance(due, date):
-            due_date = due
-        else:
-            continue
-        expenses.append(
-            FutureExpense(
-                name=name,
-                amount=float(row.get("amount", 0.0) or 0.0),
-                due_date=due_date,
-                priority=str(row.get("priority", "Medium")),
-            )
+    names = df["name"].fillna("").astype(str).str.strip()
+    due_dates = pd.to_datetime(df["due_date"], errors="coerce")
+    valid = (names.ne("") & due_dates.notna()).to_numpy()
+    amounts = df.loc[valid, "amount"].to_numpy(dtype=float, na_value=0.0)
+    priorities = df.loc[valid, "priority"].fillna("Medium").astype(str)
+    return [
+        FutureExpense(name=name, amount=amount, due_date=due_date, priority=priority)
+        for name, amount, due_date, priority in zip(
+            names[valid], amounts.tolist(), due_dates[valid].dt.date, priorities
         )
-    return expenses
+    ]
+
+
+def _record_key(records: List[MonthlyRecord]) -> tuple:
+    return tuple(
+        (
+            record.period,
+            record.income,
+            record.essential_expenses,
+            record.discretionary_expenses,
+            record.other_expenses,
+            record.savings_contribution,
+        )
+        for record in records
+    )
+
+
+def _expense_key(expenses: List[FutureExpense]) -> tuple:
+    return tuple((expense.name, expense.amount, expense.due_date, expense.priority) for expense in expenses)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_summary(records: tuple) -> dict:
+    return summarize_cash_flow(MonthlyRecord(*values) for values in records)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_plan_inputs(expenses: tuple, start_date: date) -> PreparedExpensePlan:
+    return prepare_expense_plan([FutureExpense(*values) for values in expenses], start_date=start_date)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_forecast(totals: tuple, last_period: date, periods_ahead: int) -> List[Tuple[date, float]]:
+    return forecast_from_totals(totals, last_period, periods_ahead=periods_ahead)
+
+
+@st.cache_resource(show_spinner=False)
+def _build_pie(
+    names: tuple,
+    values: tuple,
+    title: str,
+    names_label: str = "name",
+    values_label: str = "amount",
+):
+    figure = px.pie(
+        names=list(names),
+        values=list(values),
+        title=title,
+        labels={"names": names_label, "values": values_label},
+    )
+    figure.update_traces(textposition="inside", textinfo="label+percent")
+    return figure
 
 
 if st.button("Analyse my plan", type="primary"):
     monthly_records = _to_monthly_records(history_df)
     if monthly_records:
-        summary = summarize_cash_flow(monthly_records)
+        summary = _cached_summary(_record_key(monthly_records))
         avg_surplus = summary["avg_income"] - summary["avg_total_expenses"]
     else:
         if breakdown_totals["total"] > 0:
@@ -275,11 +355,8 @@ if st.button("Analyse my plan", type="primary"):
     if not future_expenses:
         st.warning("Add at least one future expense to create a plan.")
     else:
-        plan = build_future_expense_plan(
-            current_balance=current_savings,
-            average_monthly_surplus=avg_surplus,
-            future_expenses=future_expenses,
-        )
+        plan_inputs = _cached_plan_inputs(_expense_key(future_expenses), date.today())
+        plan = evaluate_expense_plan(plan_inputs, current_savings, avg_surplus)
         gap = compute_total_gap(plan, avg_surplus)
 
         st.subheader("Cash Flow Snapshot")
@@ -297,7 +374,7 @@ if st.button("Analyse my plan", type="primary"):
 
         st.subheader("Savings Plan")
         plan_df = pd.DataFrame(plan)
-        plan_df["readiness"] = plan_df["readiness_ratio"].apply(lambda r: f"{r * 100:.0f}%")
+        plan_df["readiness"] = (plan_df["readiness_ratio"] * 100).round().astype(int).astype(str) + "%"
         st.dataframe(
             plan_df[
                 [
@@ -345,7 +422,7 @@ if st.button("Analyse my plan", type="primary"):
                 f"You need an additional ${gap['savings_gap']:,.0f} to fund every goal before its due date."
             )
         elif gap["total_remaining_goal"] > 0 and avg_surplus > 0:
-            months_to_clear = math.ceil(gap["total_remaining_goal"] / max(avg_surplus, 1e-9))
+            months_to_clear = math.ceil(gap["total_remaining_goal"] / avg_surplus)
             insights.append(
                 f"At your current surplus you could fund the remaining ${gap['total_remaining_goal']:,.0f} "
                 f"in about {months_to_clear} month(s)."
@@ -371,19 +448,21 @@ if st.button("Analyse my plan", type="primary"):
         chart_col1, chart_col2 = st.columns(2)
         with chart_col1:
             if named_expenses:
-                detail_df = pd.DataFrame(named_expenses)
-                expense_fig = px.pie(detail_df, values="amount", names="name", title="Monthly expense breakdown")
-                expense_fig.update_traces(textposition="inside", textinfo="label+percent")
+                expense_fig = _build_pie(
+                    tuple(entry["name"] for entry in named_expenses),
+                    tuple(entry["amount"] for entry in named_expenses),
+                    "Monthly expense breakdown",
+                )
                 st.plotly_chart(expense_fig, use_container_width=True)
             else:
                 expense_data = pd.DataFrame(
                     {
                         "Category": ["Essential", "Discretionary", "Other", "Savings"],
                         "Amount": [
-                            max(summary["avg_essential"], 0.0),
-                            max(summary["avg_discretionary"], 0.0),
-                            max(summary["avg_other"], 0.0),
-                            max(summary["avg_savings"], 0.0),
+                            summary["avg_essential"],
+                            summary["avg_discretionary"],
+                            summary["avg_other"],
+                            summary["avg_savings"],
                         ],
                     }
                 )
@@ -391,8 +470,13 @@ if st.button("Analyse my plan", type="primary"):
                 if expense_data.empty:
                     st.write("Enter expense amounts to view the allocation breakdown.")
                 else:
-                    expense_fig = px.pie(expense_data, values="Amount", names="Category", title="Average monthly allocation")
-                    expense_fig.update_traces(textposition="inside", textinfo="label+percent")
+                    expense_fig = _build_pie(
+                        tuple(expense_data["Category"]),
+                        tuple(expense_data["Amount"]),
+                        "Average monthly allocation",
+                        names_label="Category",
+                        values_label="Amount",
+                    )
                     st.plotly_chart(expense_fig, use_container_width=True)
 
         with chart_col2:
@@ -408,34 +492,32 @@ if st.button("Analyse my plan", type="primary"):
             if remaining.empty:
                 st.write("Add goal amounts to see how your targets are distributed.")
             else:
-                goal_fig = px.pie(remaining, values=value_field, names="name", title=title)
-                goal_fig.update_traces(textposition="inside", textinfo="label+percent")
+                goal_fig = _build_pie(
+                    tuple(remaining["name"]),
+                    tuple(remaining[value_field]),
+                    title,
+                    values_label=value_field,
+                )
                 st.plotly_chart(goal_fig, use_container_width=True)
 
         st.subheader("Expense trend and forecast")
         if monthly_records:
-            history = pd.DataFrame(
-                {
-                    "period": [record.period for record in monthly_records],
-                    "total_expenses": [record.total_expenses for record in monthly_records],
-                }
-            ).sort_values("period")
-            future_forecast = forecast_expenses(monthly_records, periods_ahead=6)
-            forecast_df = pd.DataFrame(
+            actuals = [record.total_expenses for record in monthly_records]
+            future_forecast = _cached_forecast(tuple(actuals), monthly_records[-1].period, periods_ahead=6)
+            forecasts = [max(value, 0.0) for _, value in future_forecast]
+            chart_data = pd.DataFrame(
                 {
-                    "period": [item[0] for item in future_forecast],
-                    "total_expenses": [max(item[1], 0.0) for item in future_forecast],
-                }
+                    "Actual": actuals + [np.nan] * len(forecasts),
+                    "Forecast": [np.nan] * len(actuals) + forecasts,
+                },
+                index=pd.Index(
+                    [record.period for record in monthly_records] + [period for period, _ in future_forecast],
+                    name="period",
+                ),
             )
-            combined = pd.concat([
-                history.assign(type="Actual"),
-                forecast_df.assign(type="Forecast"),
-            ])
-            chart_data = combined.pivot_table(
-                index="period",
-                columns="type",
-                values="total_expenses",
-            ).sort_index()
+            if not chart_data.index.is_unique:
+                chart_data = chart_data.groupby(level=0).mean()
+            chart_data = chart_data.sort_index()
             st.line_chart(chart_data)
         else:
             st.write("Add historical data to see expense forecasts.")
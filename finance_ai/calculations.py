@@ -1,8 +1,19 @@
 ﻿from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date
-from typing import Iterable, List, Optional
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels below run as plain Python without it.
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 
 @dataclass
@@ -15,14 +26,12 @@ class MonthlyRecord:
     discretionary_expenses: float
     other_expenses: float = 0.0
     savings_contribution: float = 0.0
+    total_expenses: float = field(init=False)
+    net_cash_flow: float = field(init=False)
 
-    @property
-    def total_expenses(self) -> float:
-        return self.essential_expenses + self.discretionary_expenses + self.other_expenses
-
-    @property
-    def net_cash_flow(self) -> float:
-        return self.income - self.total_expenses - self.savings_contribution
+    def __post_init__(self) -> None:
+        self.total_expenses = self.essential_expenses + self.discretionary_expenses + self.other_expenses
+        self.net_cash_flow = self.income - self.total_expenses - self.savings_contribution
 
 
 @dataclass
@@ -33,6 +42,15 @@ class FutureExpense:
     priority: str = "medium"
 
 
+@dataclass
+class PreparedExpensePlan:
+    """Future expenses in plan order with their amounts and months until due."""
+
+    expenses: List[FutureExpense]
+    amounts: np.ndarray
+    months_to_due: np.ndarray
+
+
 _PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2}
 
 def summarize_cash_flow(records: Iterable[MonthlyRecord]) -> dict:
@@ -42,89 +60,162 @@ def summarize_cash_flow(records: Iterable[MonthlyRecord]) -> dict:
     if not records:
         raise ValueError("At least one monthly record is required to summarise cash flow")
 
-    income_values = [r.income for r in records]
-    essential_values = [r.essential_expenses for r in records]
-    discretionary_values = [r.discretionary_expenses for r in records]
-    other_values = [r.other_expenses for r in records]
-    savings_values = [r.savings_contribution for r in records]
-    total_expenses = [r.total_expenses for r in records]
-    net_values = [r.net_cash_flow for r in records]
-
+    values = np.array(
+        [
+            (
+                r.income,
+                r.essential_expenses,
+                r.discretionary_expenses,
+                r.other_expenses,
+                r.savings_contribution,
+            )
+            for r in records
+        ],
+        dtype=np.float64,
+    )
     months = len(records)
+    income, essential, discretionary, other, savings = (values.sum(axis=0) / months).tolist()
+    total_expenses = essential + discretionary + other
 
     return {
         "months": months,
-        "avg_income": sum(income_values) / months,
-        "avg_total_expenses": sum(total_expenses) / months,
-        "avg_essential": sum(essential_values) / months,
-        "avg_discretionary": sum(discretionary_values) / months,
-        "avg_other": sum(other_values) / months,
-        "avg_savings": sum(savings_values) / months,
-        "avg_net": sum(net_values) / months,
+        "avg_income": income,
+        "avg_total_expenses": total_expenses,
+        "avg_essential": essential,
+        "avg_discretionary": discretionary,
+        "avg_other": other,
+        "avg_savings": savings,
+        "avg_net": income - total_expenses - savings,
     }
 
 
-def required_emergency_fund(monthly_essential: float, months: int = 3) -> float:
-    """Basic emergency fund recommendation."""
+def required_emergency_fund(
+    monthly_essential: Union[float, np.ndarray],
+    months: Union[int, np.ndarray] = 3,
+) -> Union[float, np.ndarray]:
+    """Basic emergency fund recommendation, for a single scenario or an array of them."""
 
-    return max(monthly_essential, 0.0) * max(months, 0)
+    fund = np.clip(monthly_essential, 0.0, None) * np.clip(months, 0, None)
+    return fund if np.ndim(fund) else float(fund)
 
 
-def months_between(start: date, end: date) -> int:
-    """Return the number of whole months between two dates, inclusive of the due month."""
+def add_months(base: date, months: Union[int, np.ndarray]) -> Union[date, List[date]]:
+    """Return the first day of the month ``months`` after ``base``, for one offset or an array of them."""
 
-    months = (end.year - start.year) * 12 + (end.month - start.month)
-    return max(months, 0) + 1
+    shifted = np.datetime64(base, "M") + np.asarray(months, dtype="timedelta64[M]")
+    return shifted.astype("datetime64[D]").tolist()
 
 
-def build_future_expense_plan(
-    current_balance: float,
-    average_monthly_surplus: float,
+def months_between(start: date, end: Union[date, Iterable[date]]) -> Union[int, np.ndarray]:
+    """Return the number of whole months between two dates, inclusive of the due month.
+
+    ``end`` may also be a sequence of dates, in which case an array of month counts is returned.
+    """
+
+    months = (np.asarray(end, dtype="datetime64[M]") - np.datetime64(start, "M")).astype(np.int64)
+    months = np.maximum(months, 0) + 1
+    return months if np.ndim(months) else int(months)
+
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def _plan_kernel(
+    amounts: np.ndarray,
+    months_to_due: np.ndarray,
+    balance: float,
+    surplus: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Draw the balance down against each amount in order and derive the per-goal figures in one pass."""
+
+    n = amounts.size
+    allocated = np.empty(n)
+    remaining = np.empty(n)
+    monthly = np.empty(n)
+    readiness = np.empty(n)
+    for i in range(n):
+        allocated[i] = min(balance, amounts[i])
+        balance -= allocated[i]
+        remaining[i] = max(amounts[i] - allocated[i], 0.0)
+        monthly[i] = remaining[i] / months_to_due[i] if months_to_due[i] > 0 else remaining[i]
+        if remaining[i] <= 0:
+            readiness[i] = 1.0
+        elif surplus <= 0:
+            readiness[i] = 0.0
+        else:
+            readiness[i] = min(surplus * months_to_due[i] / remaining[i], 1.0)
+    return allocated, remaining, monthly, readiness
+
+
+def prepare_expense_plan(
     future_expenses: Iterable[FutureExpense],
     start_date: Optional[date] = None,
-) -> List[dict]:
-    """Create a month-by-month saving plan for the supplied future expenses."""
+) -> PreparedExpensePlan:
+    """Sort future expenses into plan order and gather the per-expense inputs."""
 
     if start_date is None:
         start_date = date.today()
 
-    def _sort_key(expense: FutureExpense) -> tuple[int, date]:
-        priority_value = str(expense.priority or "").lower()
-        priority_rank = _PRIORITY_RANK.get(priority_value, 3)
-        return (priority_rank, expense.due_date)
-
-    sorted_expenses = sorted(future_expenses, key=_sort_key)
-    plan: List[dict] = []
-    balance_remaining = max(current_balance, 0.0)
+    future_expenses = list(future_expenses)
+    count = len(future_expenses)
+    ranks = np.fromiter(
+        (_PRIORITY_RANK.get(str(e.priority or "").lower(), 3) for e in future_expenses),
+        dtype=np.int8,
+        count=count,
+    )
+    due_ordinals = np.fromiter((e.due_date.toordinal() for e in future_expenses), dtype=np.int64, count=count)
+    order = np.lexsort((due_ordinals, ranks))
+    sorted_expenses = [future_expenses[i] for i in order]
+    amounts = np.array([e.amount for e in sorted_expenses], dtype=np.float64)
+    months_to_due = months_between(start_date, [e.due_date for e in sorted_expenses])
+    return PreparedExpensePlan(expenses=sorted_expenses, amounts=amounts, months_to_due=months_to_due)
+
+
+def evaluate_expense_plan(
+    prepared: PreparedExpensePlan,
+    current_balance: float,
+    average_monthly_surplus: float,
+) -> List[dict]:
+    """Allocate the current balance and surplus across a prepared plan."""
+
+    allocated, remaining_goal, monthly_needed, readiness_ratio = _plan_kernel(
+        prepared.amounts,
+        prepared.months_to_due,
+        float(max(current_balance, 0.0)),
+        float(average_monthly_surplus),
+    )
+
+    return [
+        {
+            "name": expense.name,
+            "priority": expense.priority,
+            "due_date": expense.due_date,
+            "months_to_goal": months,
+            "amount": expense.amount,
+            "allocated_from_balance": allocated_now,
+            "remaining_goal": remaining,
+            "suggested_monthly_contribution": monthly,
+            "readiness_ratio": readiness,
+        }
+        for expense, months, allocated_now, remaining, monthly, readiness in zip(
+            prepared.expenses,
+            prepared.months_to_due.tolist(),
+            allocated.tolist(),
+            remaining_goal.tolist(),
+            monthly_needed.tolist(),
+            readiness_ratio.tolist(),
+        )
+    ]
 
-    for expense in sorted_expenses:
-        months_to_due = months_between(start_date, expense.due_date)
-        allocated_now = min(balance_remaining, expense.amount)
-        balance_remaining -= allocated_now
-        remaining_goal = max(expense.amount - allocated_now, 0.0)
-        monthly_needed = remaining_goal / months_to_due if months_to_due > 0 else remaining_goal
 
-        if average_monthly_surplus <= 0:
-            readiness_ratio = 0.0 if remaining_goal > 0 else 1.0
-        else:
-            possible_savings = average_monthly_surplus * months_to_due
-            readiness_ratio = min(possible_savings / remaining_goal, 1.0) if remaining_goal > 0 else 1.0
-
-        plan.append(
-            {
-                "name": expense.name,
-                "priority": expense.priority,
-                "due_date": expense.due_date,
-                "months_to_goal": months_to_due,
-                "amount": expense.amount,
-                "allocated_from_balance": allocated_now,
-                "remaining_goal": remaining_goal,
-                "suggested_monthly_contribution": monthly_needed,
-                "readiness_ratio": readiness_ratio,
-            }
-        )
+def build_future_expense_plan(
+    current_balance: float,
+    average_monthly_surplus: float,
+    future_expenses: Iterable[FutureExpense],
+    start_date: Optional[date] = None,
+) -> List[dict]:
+    """Create a month-by-month saving plan for the supplied future expenses."""
 
-    return plan
+    prepared = prepare_expense_plan(future_expenses, start_date)
+    return evaluate_expense_plan(prepared, current_balance, average_monthly_surplus)
 
 
 def compute_total_gap(plan: Iterable[dict], average_monthly_surplus: float) -> dict:
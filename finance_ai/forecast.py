@@ -1,18 +1,27 @@
 ﻿from __future__ import annotations
 
 from datetime import date
-from typing import Iterable, List, Tuple
+from typing import Iterable, List, Sequence, Tuple
 
 import numpy as np
-from sklearn.linear_model import LinearRegression
 
-from .calculations import MonthlyRecord
+from .calculations import MonthlyRecord, add_months
 
 
-def _prepare_features(records: List[MonthlyRecord]) -> Tuple[np.ndarray, np.ndarray]:
-    X = np.arange(len(records)).reshape(-1, 1)
-    y = np.array([record.total_expenses for record in records])
-    return X, y
+def _fit_trend(totals: np.ndarray) -> Tuple[float, float]:
+    """Closed-form least squares fit of total expenses against the month index."""
+
+    x = np.arange(totals.size, dtype=np.float64)
+    x_centered = x - x.mean()
+    slope = float((x_centered * (totals - totals.mean())).sum() / (x_centered**2).sum())
+    intercept = float(totals.mean() - slope * x.mean())
+    return slope, intercept
+
+
+def _future_periods(last_period: date, periods_ahead: int) -> List[date]:
+    """Month-start dates for the ``periods_ahead`` months following ``last_period``."""
+
+    return add_months(last_period, np.arange(1, periods_ahead + 1))
 
 
 def forecast_expenses(
@@ -25,31 +34,30 @@ def forecast_expenses(
     if not records:
         raise ValueError("At least one monthly record is required to forecast expenses")
 
-    if len(records) < 2:
-        last_record = records[-1]
-        return [
-            (increment_month(last_record.period, i + 1), last_record.total_expenses)
-            for i in range(periods_ahead)
-        ]
-
-    X, y = _prepare_features(records)
-    model = LinearRegression()
-    model.fit(X, y)
-
-    last_index = len(records) - 1
-    projections: List[Tuple[date, float]] = []
-    for step in range(1, periods_ahead + 1):
-        new_index = last_index + step
-        forecast_value = float(model.predict(np.array([[new_index]]))[0])
-        next_period = increment_month(records[-1].period, step)
-        projections.append((next_period, forecast_value))
-
-    return projections
-
-
-def increment_month(current: date, months: int) -> date:
-    year_offset, month = divmod(current.month - 1 + months, 12)
-    new_year = current.year + year_offset
-    new_month = month + 1
-    day = min(current.day, 28)
-    return date(new_year, new_month, day)
+    return forecast_from_totals(
+        [record.total_expenses for record in records],
+        records[-1].period,
+        periods_ahead,
+    )
+
+
+def forecast_from_totals(
+    totals: Sequence[float],
+    last_period: date,
+    periods_ahead: int = 6,
+) -> List[Tuple[date, float]]:
+    """Project a series of monthly expense totals ending at ``last_period`` forward."""
+
+    totals = np.asarray(totals, dtype=np.float64)
+    if totals.size == 0:
+        raise ValueError("At least one monthly total is required to forecast expenses")
+
+    periods = _future_periods(last_period, periods_ahead)
+    if totals.size < 2:
+        return [(period, float(totals[-1])) for period in periods]
+
+    slope, intercept = _fit_trend(totals)
+    future_index = np.arange(totals.size, totals.size + periods_ahead)
+    forecast_values = (intercept + slope * future_index).tolist()
+
+    return list(zip(periods, forecast_values))